@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.pool import StaticPool
+
+from . import main
+from .main import app, get_session
+
+# --- One in-memory database shared by the whole test session ---
+TEST_DATABASE_URL = "sqlite://"
+test_engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool, )
+
+
+# --- Create tables once, in the test engine only ---
+@pytest.fixture(scope="session", autouse=True)
+def prepare_database():
+    # Point the app's engine at it as well, so the startup hook never opens database.db
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(main, "engine", test_engine)
+        SQLModel.metadata.create_all(test_engine)
+        yield
+        SQLModel.metadata.drop_all(test_engine)  # optional cleanup
+
+
+@pytest.fixture(scope="session", autouse=True)
+def override_get_session(prepare_database):
+    # Every request gets its own session on the shared test engine
+    def get_session_override():
+        with Session(test_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    yield
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def session():
+    with Session(test_engine) as session:
+        yield session
+
+
+@pytest.fixture()
+def client():
+    with TestClient(app) as c:
+        c.get("/reset/")  # Reset the state before each test
+        yield c
@@ -1,5 +1,5 @@
+import hashlib
 import heapq
-import json
 from enum import Enum
 # -----------------------------
 # Persistence With SQLite Setup
@@ -7,11 +7,17 @@ from enum import Enum
 from typing import Annotated
 from typing import Dict, List, Tuple, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import orjson
 from pydantic import BaseModel
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import floyd_warshall
 # models_sqlite.py
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session, SQLModel, create_engine, select, Field
 
 
@@ -30,7 +36,7 @@ class OrderStatus(str, Enum):
 class Robot(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     name: str = Field(index=True)
-    status: RobotStatus
+    status: RobotStatus = Field(index=True)
     node: str
 
 
@@ -39,7 +45,7 @@ class Order(SQLModel, table=True):
     name: str = Field(index=True, unique=True)
     source: str
     target: str
-    status: OrderStatus = OrderStatus.NEW
+    status: OrderStatus = Field(default=OrderStatus.NEW, index=True)
 
 
 class RouteOrderLink(SQLModel, table=True):
@@ -54,7 +60,22 @@ sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+# QueuePool is already SQLAlchemy's default for file databases; it is sized here for concurrent threadpool requests
+engine = create_engine(sqlite_url, connect_args=connect_args, poolclass=QueuePool, pool_size=5, max_overflow=10)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer; NORMAL only fsyncs at checkpoints in WAL mode
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64 MB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+event.listen(engine, "connect", _set_sqlite_pragmas)
 
 
 def create_db_and_tables():
@@ -69,6 +90,12 @@ def get_session():
 SessionDep = Annotated[Session, Depends(get_session)]
 
 
+def begin_write(session: Session) -> None:
+    # Take SQLite's write lock before reading, so read-modify-write handlers on the threadpool (or in other
+    # workers) run one at a time and never act on rows another request is about to change
+    session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
 # -----------------------------
 # Domain Models (Pydantic)
 # -----------------------------
@@ -163,14 +190,70 @@ app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:5173",  # Vi
 # Helpers
 # -----------------------------
 
-def _graph_nodes_set() -> set:
-    return set(GRAPH.nodes)
+# Node set of the static GRAPH used for request validation; rebuild if GRAPH changes
+_GRAPH_NODES: frozenset = frozenset(GRAPH.nodes)
+
+# /getGraph body serialized once, with a strong ETag so clients can revalidate without a payload
+_GRAPH_JSON: bytes = orjson.dumps(GRAPH.model_dump(by_alias=True))
+_GRAPH_ETAG: str = f'"{hashlib.md5(_GRAPH_JSON, usedforsecurity=False).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison (RFC 9110): a comma-separated list of tags, each possibly W/-prefixed, or "*"
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _index_nodes(graph: 'Graph') -> Dict[str, int]:
+    return {node: i for i, node in enumerate(graph.nodes)}
+
+
+def _edge_tuples(graph: 'Graph', index: Dict[str, int]) -> List[Tuple[int, int, float]]:
+    # Flat (from, to, weight) index tuples, so the builders below avoid per-edge model attribute access
+    return [(index[edge.from_], index[edge.to], edge.weight) for edge in graph.edges]
+
+
+def _build_adjacency(edges: List[Tuple[int, int, float]], node_count: int) -> List[List[Tuple[int, float]]]:
+    # Adjacency over contiguous node indices, so Dijkstra can use lists instead of string-keyed dicts
+    adj: List[List[Tuple[int, float]]] = [[] for _ in range(node_count)]
+    for from_, to, weight in edges:
+        adj[from_].append((to, weight))
+        adj[to].append((from_, weight))  # treat as undirected
+    return adj
+
+
+def _build_csr(edges: List[Tuple[int, int, float]], node_count: int) -> csr_matrix:
+    # Keep the cheapest edge between two nodes; csr_matrix would sum duplicates
+    weights: Dict[Tuple[int, int], float] = {}
+    for from_, to, weight in edges:
+        weights[(from_, to)] = min(weight, weights.get((from_, to), float('inf')))
+    rows = [row for row, _ in weights]
+    cols = [col for _, col in weights]
+    return csr_matrix((list(weights.values()), (rows, cols)), shape=(node_count, node_count))
+
+
+# GRAPH is static for the lifetime of the process, so its derived structures are built once; rebuild if it changes
+_NODE_INDEX: Dict[str, int] = _index_nodes(GRAPH)
+_EDGES: List[Tuple[int, int, float]] = _edge_tuples(GRAPH, _NODE_INDEX)
+_ADJ: List[List[Tuple[int, float]]] = _build_adjacency(_EDGES, len(GRAPH.nodes))
+# Sparse matrix form of GRAPH for scipy's C shortest-path routines
+_CSR: csr_matrix = _build_csr(_EDGES, len(GRAPH.nodes))
+
+# All-pairs distance and next-hop matrices over GRAPH's node indices, filled in once at startup
+_DIST: List[List[float]] = []
+_NEXT_HOP: List[List[int]] = []
 
 
 def seed_data(session: SessionDep):
     """Insert sample data if the table is empty."""
-    orders = SEED_ORDERS
-    robots = SEED_ROBOTS
+    # Fresh copies on every call: the SEED_* instances would otherwise stay bound to the first session that added them
+    orders = [Order(**order.model_dump()) for order in SEED_ORDERS]
+    robots = [Robot(**robot.model_dump()) for robot in SEED_ROBOTS]
     session.add_all(orders)
     session.add_all(robots)
     session.commit()
@@ -178,47 +261,77 @@ def seed_data(session: SessionDep):
 
 ## todo mention the use of ChatGPT in the implementation of Dijkstra's algorithm and the use of copilot in adding this comment
 def find_shortest_path(from_: str, to: str, graph: 'Graph') -> Tuple[float, List[str]]:
-    # Build adjacency list from edges
-    adj: Dict[str, List[Tuple[str, float]]] = {node: [] for node in graph.nodes}
-    for edge in graph.edges:
-        adj[edge.from_].append((edge.to, edge.weight))
-        adj[edge.to].append((edge.from_, edge.weight))  # treat as undirected
-
-    # Dijkstra setup
-    distances: Dict[str, float] = {node: float('inf') for node in graph.nodes}
-    previous: Dict[str, Optional[str]] = {node: None for node in graph.nodes}
-    distances[from_] = 0
-
-    # Min-heap: (distance, node)
-    heap = [(0, from_)]
+    # Reuse the cached index and adjacency list for the app graph, build them for any other graph
+    if graph is GRAPH:
+        index, adj = _NODE_INDEX, _ADJ
+    else:
+        index = _index_nodes(graph)
+        adj = _build_adjacency(_edge_tuples(graph, index), len(graph.nodes))
+    source, target = index[from_], index[to]
+
+    # Dijkstra setup, over node indices
+    distances: List[float] = [float('inf')] * len(graph.nodes)
+    previous: List[int] = [-1] * len(graph.nodes)
+    distances[source] = 0
+
+    # Min-heap: (distance, node index)
+    heap = [(0, source)]
 
     while heap:
         current_dist, current_node = heapq.heappop(heap)
-        if current_node == to:
-            break  # early exit
+        if current_node == target or current_dist >= distances[target]:
+            break  # early exit: nothing left in the heap can improve the path to the target
 
         if current_dist > distances[current_node]:
-            continue
+            continue  # stale entry
 
         for neighbor, weight in adj[current_node]:
             distance = current_dist + weight
-            if distance < distances[neighbor]:
+            # Prune entries that cannot beat the best path to the target found so far
+            if distance < distances[neighbor] and distance < distances[target]:
                 distances[neighbor] = distance
                 previous[neighbor] = current_node
                 heapq.heappush(heap, (distance, neighbor))
 
-    # Reconstruct shortest path
+    if distances[target] == float('inf'):
+        return float('inf'), []  # no path found
+
+    # Reconstruct shortest path, mapping indices back to node labels
     path = []
-    node = to
-    while node is not None:
-        path.append(node)
+    node = target
+    while node != -1:
+        path.append(graph.nodes[node])
         node = previous[node]
     path.reverse()
 
-    if distances[to] == float('inf'):
+    return distances[target], path
+
+
+def _compute_all_pairs() -> Tuple[List[List[float]], List[List[int]]]:
+    # Floyd-Warshall over GRAPH. On an undirected graph the predecessor of s on the shortest path from t
+    # is the next hop from s towards t, so the predecessor matrix transposes into a next-hop matrix.
+    dist_matrix, predecessors = floyd_warshall(_CSR, directed=False, return_predecessors=True)
+    predecessors = predecessors.tolist()
+    node_count = len(GRAPH.nodes)
+    next_hop = [[predecessors[target][source] for target in range(node_count)] for source in range(node_count)]
+    return dist_matrix.tolist(), next_hop
+
+
+def shortest_path(from_: str, to: str) -> Tuple[float, List[str]]:
+    # Walks the precomputed next-hop matrix; falls back to Dijkstra until startup has filled it in
+    if not _NEXT_HOP:
+        return find_shortest_path(from_, to, GRAPH)
+
+    source, target = _NODE_INDEX[from_], _NODE_INDEX[to]
+    distance = _DIST[source][target]
+    if distance == float('inf'):
         return float('inf'), []  # no path found
 
-    return distances[to], path
+    path = [from_]
+    while source != target:
+        source = _NEXT_HOP[source][target]
+        path.append(GRAPH.nodes[source])
+    return distance, path
 
 
 # -----------------------------
@@ -234,6 +347,7 @@ def find_shortest_path(from_: str, to: str, graph: 'Graph') -> Tuple[float, List
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    _DIST[:], _NEXT_HOP[:] = _compute_all_pairs()
 
 
 # -----------------------------
@@ -246,7 +360,7 @@ async def healthz():
 
 
 @app.get("/reset", tags=["simulation"], description="Reset the database to the initial seeded state")
-async def reset(session: SessionDep):
+def reset(session: SessionDep):
     SQLModel.metadata.drop_all(bind=session.bind)
     SQLModel.metadata.create_all(bind=session.bind)
     seed_data(session=session)
@@ -254,10 +368,9 @@ async def reset(session: SessionDep):
 
 
 @app.post("/addOrder", response_model=Order, tags=["orders"], description="Endpoint to add a new order")
-async def add_order(req: AddOrderRequest, session: SessionDep) -> Order:
+def add_order(req: AddOrderRequest, session: SessionDep) -> Order:
     # Validate nodes exist in graph
-    nodes = _graph_nodes_set()
-    if req.source not in nodes or req.target not in nodes:
+    if req.source not in _GRAPH_NODES or req.target not in _GRAPH_NODES:
         raise HTTPException(status_code=400, detail="source/target must be valid graph nodes")
 
     db_order = Order(name=req.name, source=req.source, target=req.target, status=OrderStatus.NEW)
@@ -273,46 +386,64 @@ async def add_order(req: AddOrderRequest, session: SessionDep) -> Order:
     return db_order
 
 
-@app.get("/getOrders", response_model=List[RetrieveOrderRequest], tags=["orders"], description="Endpoint returning all orders")
-async def get_orders(session: SessionDep):
-    return session.exec(select(Order)).all()
+# The list endpoints build plain dicts from column tuples and return the response themselves, skipping ORM
+# hydration, response_model validation and jsonable_encoder; the schemas are still documented through `responses`.
+@app.get("/getOrders", response_class=ORJSONResponse, response_model=None,
+         responses={200: {"model": List[RetrieveOrderRequest]}}, tags=["orders"], description="Endpoint returning all orders")
+def get_orders(session: SessionDep) -> ORJSONResponse:
+    rows = session.exec(select(Order.id, Order.name, Order.source, Order.target, Order.status)).all()
+    return ORJSONResponse([{"id": id_, "name": name, "source": source, "target": target, "status": status}
+                           for id_, name, source, target, status in rows])
 
 
-@app.get("/getRobots", response_model=List[RetrieveRobotRequest], tags=["robots"], description="Endpoint returning all robots")
-async def get_robots(session: SessionDep):
-    return session.exec(select(Robot)).all()
+@app.get("/getRobots", response_class=ORJSONResponse, response_model=None,
+         responses={200: {"model": List[RetrieveRobotRequest]}}, tags=["robots"], description="Endpoint returning all robots")
+def get_robots(session: SessionDep) -> ORJSONResponse:
+    rows = session.exec(select(Robot.id, Robot.name, Robot.status, Robot.node)).all()
+    return ORJSONResponse([{"id": id_, "name": name, "status": status, "node": node}
+                           for id_, name, status, node in rows])
 
 
-@app.get("/getGraph", response_model=Graph, tags=["graph"], description="Endpoint returning the graph")
-async def get_graph() -> Graph:
-    return GRAPH
+@app.get("/getGraph", response_model=None, responses={200: {"model": Graph}, 304: {"description": "Not Modified"}},
+         tags=["graph"], description="Endpoint returning the graph")
+async def get_graph(request: Request) -> Response:
+    headers = {"ETag": _GRAPH_ETAG}
+    if _etag_matches(request.headers.get("if-none-match"), _GRAPH_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(content=_GRAPH_JSON, media_type="application/json", headers=headers)
 
 
 @app.post("/assignNearestIdleRobot", tags=["scheduling"], description="Assign the nearest idle robot to the given order")
-async def assign_nearest_idle_robot(order: AssignOrderRequest, session: SessionDep):
+def assign_nearest_idle_robot(order: AssignOrderRequest, session: SessionDep):
+    begin_write(session)
     assigned_order = session.exec(select(Order).where(Order.name == order.name)).first()
     if not assigned_order:
         raise HTTPException(status_code=404, detail="Order not found")
-    robots = list(session.exec(select(Robot).where(Robot.status==RobotStatus.IDLE)).all())
-    if not robots:
+    if assigned_order.status != OrderStatus.NEW:
+        raise HTTPException(status_code=409, detail="Order is already assigned")
+    # Ordered by name so the first robot found at the source already wins the tie-break
+    idle_robots = session.exec(select(Robot).where(Robot.status == RobotStatus.IDLE).order_by(Robot.name)).all()
+    if not idle_robots:
         raise HTTPException(status_code=404, detail="No idle robot available")
 
-    path_for_robot = []
-    for robot in robots:
-        distance, path = find_shortest_path(robot.node, order.source, GRAPH)
-        path_for_robot.append({"robot": robot, "distance": distance, "path": path})
-
-    resulting_path = sorted(path_for_robot, key=lambda x: (x["distance"], x["robot"].name))[0]
-    chosen_robot, path = resulting_path["robot"], resulting_path["path"]
+    # A robot standing on the source (distance 0) cannot be beaten, so skip the path searches
+    chosen_robot = next((robot for robot in idle_robots if robot.node == order.source), None)
+    if chosen_robot is not None:
+        path = [chosen_robot.node]
+    else:
+        path_for_robot = []
+        for robot in idle_robots:
+            distance, path = shortest_path(robot.node, order.source)
+            path_for_robot.append({"robot": robot, "distance": distance, "path": path})
+
+        resulting_path = min(path_for_robot, key=lambda x: (x["distance"], x["robot"].name))
+        chosen_robot, path = resulting_path["robot"], resulting_path["path"]
     assigned_order.status = OrderStatus.IN_PROGRESS
-    assigned_robot = session.exec(select(Robot).where(Robot.id == chosen_robot.id)).first()
-    assigned_robot.status = RobotStatus.EXECUTING
-    order_path = RouteOrderLink(route_json=json.dumps(path), order_id=assigned_order.id, robot_id=assigned_robot.id,
-                                distance=len(path))
-
-    session.add(assigned_order)
-    session.add(assigned_robot)
-    session.add(order_path)
+    chosen_robot.status = RobotStatus.EXECUTING  # already attached to the session, no need to re-select it
+    order_path = RouteOrderLink(route_json=orjson.dumps(path).decode(), order_id=assigned_order.id,
+                                robot_id=chosen_robot.id, distance=len(path))
+
+    session.add_all([assigned_order, chosen_robot, order_path])
     session.commit()
     return {"robot_name": chosen_robot.name, "path": path}
 
@@ -332,7 +463,7 @@ class RoutesResponse(BaseModel):
 
 # NOTE: These are *stubs* for stretch goals; they currently return empty data.
 @app.get("/routes", response_model=RoutesResponse, tags=["simulation"], description="Endpoint returning current robot routes")
-async def get_routes(session: SessionDep) -> RoutesResponse:
+def get_routes(session: SessionDep) -> RoutesResponse:
     stmt = (
         select(RouteOrderLink,Robot.name)
         .join(Robot , Robot.id == RouteOrderLink.robot_id)
@@ -340,26 +471,27 @@ async def get_routes(session: SessionDep) -> RoutesResponse:
     results = session.exec(stmt).all()
 
     response = [
-        Route(path=json.loads(link.route_json), robot=robot_name)
+        Route(path=orjson.loads(link.route_json), robot=robot_name)
         for link, robot_name in results
     ]
     return RoutesResponse(routes=response)
 
 
 @app.post("/tick", tags=["simulation"], description="Advance simulation by one tick (robots move along their paths)")
-async def tick(session: SessionDep) -> Dict[str, str]:
+def tick(session: SessionDep) -> Dict[str, str]:
+    begin_write(session)
     robot_paths = session.exec(select(RouteOrderLink)).all()
     for path in robot_paths:
         robot = session.exec(select(Robot).where(Robot.id == path.robot_id)).first()
         order = session.exec(select(Order).where(Order.id == path.order_id)).first()
-        new_path = json.loads(path.route_json)[1:]  # simulate moving one step along path
+        new_path = orjson.loads(path.route_json)[1:]  # simulate moving one step along path
         robot.node = new_path[0]
         if len(new_path) == 1:
             order.status = OrderStatus.DONE
             robot.status = RobotStatus.IDLE
             session.delete(path)
         else:
-            path.route_json = json.dumps(new_path)
+            path.route_json = orjson.dumps(new_path).decode()
             path.distance = len(new_path)
         session.add(robot)
         session.add(order)
@@ -1,41 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel, create_engine, Session
-from sqlmodel.pool import StaticPool
-
-from .main import app, get_session
-
-# --- Create an in-memory database just for tests ---
-TEST_DATABASE_URL = "sqlite://"
-test_engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool, )
-
-
-# --- Create tables only in the test engine ---
-@pytest.fixture(scope="session", autouse=True)
-def prepare_database():
-    SQLModel.metadata.drop_all(test_engine)
-    SQLModel.metadata.create_all(test_engine)
-    yield
-    SQLModel.metadata.drop_all(test_engine)  # optional cleanup
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
 
-
-@pytest.fixture()
-def session():
-    with Session(test_engine) as session:
-        yield session
-
-
-@pytest.fixture()
-def client(session):
-    # Override get_session to use the test session
-    def get_session_override():
-        yield session
-
-    app.dependency_overrides[get_session] = get_session_override
-    with TestClient(app) as c:
-        c.get("/reset/")  # Reset the state before each test
-        yield c
-    app.dependency_overrides.clear()
+from .main import app, get_session, shortest_path, find_shortest_path, GRAPH, RouteOrderLink, _set_sqlite_pragmas
 
 
 def test_assign_nearest_idle_robot(client: TestClient, session: Session):
@@ -62,12 +32,48 @@ def test_no_idle_robot_available(client: TestClient, session: Session):
     assert data["detail"] == "No idle robot available"
 
 
+def test_assign_order_twice(client: TestClient):
+    client.post("/assignNearestIdleRobot/", json={"name": "O-1001", "source": "B"})
+    response = client.post("/assignNearestIdleRobot/", json={"name": "O-1001", "source": "B"})
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Order is already assigned"
+
+
+def test_concurrent_assignments_claim_each_robot_once(client: TestClient, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    # The in-memory test engine shares one connection, so race the handlers against a WAL file database instead
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"check_same_thread": False})
+    event.listen(file_engine, "connect", _set_sqlite_pragmas)
+    SQLModel.metadata.create_all(file_engine)
+
+    def get_file_session():
+        with Session(file_engine) as file_session:
+            yield file_session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, get_file_session)
+    client.get("/reset/")
+    names = [f"raceOrder{i}" for i in range(8)]
+    for name in names:
+        client.post("/addOrder/", json={"name": name, "source": "B", "target": "D"})
+
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        responses = list(pool.map(
+            lambda name: client.post("/assignNearestIdleRobot/", json={"name": name, "source": "B"}), names))
+
+    assigned = sorted(response.json()["robot_name"] for response in responses if response.status_code == 200)
+    assert assigned == ["R1", "R3"]
+    assert all(response.status_code == 404 for response in responses if response.status_code != 200)
+    with Session(file_engine) as file_session:
+        assert len(file_session.exec(select(RouteOrderLink)).all()) == 2
+    file_engine.dispose()
+
+
 def test_add_order(client: TestClient, session: Session):
     response = client.post("/addOrder/", json={"name": "testOrder", "source": "A", "target": "C"})
     data = response.json()
 
     assert response.status_code == 200
-    assert data["id"] == 1
+    assert data["id"] == 2  # the seeded O-1001 takes id 1
     assert data["name"] == "testOrder"
     assert data["source"] == "A"
     assert data["target"] == "C"
@@ -117,3 +123,50 @@ def test_routes(client: TestClient, session: Session):
 
     assert response.status_code == 200
     assert data.__len__() == 1  # in the current db
+
+
+def test_shortest_path_matches_dijkstra(client: TestClient):
+    weights = {}
+    for edge in GRAPH.edges:
+        weights[(edge.from_, edge.to)] = weights[(edge.to, edge.from_)] = edge.weight
+
+    for source in GRAPH.nodes:
+        for target in GRAPH.nodes:
+            distance, path = shortest_path(source, target)
+            # Equal-cost paths may be broken differently, so compare costs rather than paths
+            assert distance == find_shortest_path(source, target, GRAPH)[0]
+            assert path[0] == source and path[-1] == target
+            assert sum(weights[step] for step in zip(path, path[1:])) == distance
+
+    assert shortest_path("A", "D") == (5, ["A", "B", "C", "D"])
+
+
+def test_get_graph_etag(client: TestClient):
+    response = client.get("/getGraph")
+    etag = response.headers["etag"]
+
+    assert response.status_code == 200
+    assert response.json()["nodes"] == GRAPH.nodes
+    assert len(response.json()["edges"]) == len(GRAPH.edges)
+
+    response = client.get("/getGraph", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/getGraph", headers={"If-None-Match": f'"stale", W/{etag}'})
+    assert response.status_code == 304
+
+    response = client.get("/getGraph", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+
+def test_get_robots(client: TestClient):
+    response = client.get("/getRobots")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data == [
+        {"id": 1, "name": "R1", "status": "IDLE", "node": "A"},
+        {"id": 2, "name": "R2", "status": "EXECUTING", "node": "C"},
+        {"id": 3, "name": "R3", "status": "IDLE", "node": "E"},
+    ]